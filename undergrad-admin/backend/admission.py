@@ -0,0 +1,132 @@
+# backend/admission.py
+"""
+Per-route admission control for expensive endpoints.
+
+Each limited route gets a RouteLimit: at most `max_concurrent` computations
+run at once (in the threadpool, so the event loop stays free), at most
+`max_queue` more wait for a slot, and identical requests (same key) that
+arrive while one is already pending share its result instead of doing the
+work again. Requests beyond the queue get 429, requests that wait longer
+than `queue_timeout` get 503; both carry a Retry-After header. Background
+work (the list prefetch) calls run(..., wait=False): it shares the limits
+and in-flight computations but is turned away with 429 instead of queueing
+behind interactive requests.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Hashable
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from profiling import follow_thread
+
+
+class RouteLimit:
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self.running = 0
+        self.waiting = 0
+        # counters
+        self.admitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.skipped = 0
+
+    def _shed(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args, wait: bool = True) -> Any:
+        """
+        Run fn(*args) in the threadpool under this route's limits, coalescing
+        on key. With wait=False, fail with 429 unless a slot is free right now.
+        """
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        if not wait and self.running + self.waiting >= self.max_concurrent:
+            self.skipped += 1
+            raise self._shed(429, f"No free {self.name} slot")
+        # waiting is bumped before the first await, so a burst arriving in
+        # one event-loop tick is counted here even before any slot is taken
+        if self.running + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise self._shed(429, f"Too many concurrent {self.name} requests")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[key] = fut
+        try:
+            result = await self._run_admitted(fn, *args)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else was waiting
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            del self._pending[key]
+
+    async def _run_admitted(self, fn, *args):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise self._shed(503, f"{self.name} is overloaded, try again shortly")
+        finally:
+            self.waiting -= 1
+
+        self.admitted += 1
+        self.running += 1
+        try:
+            return await run_in_threadpool(follow_thread(fn), *args)
+        finally:
+            self.running -= 1
+            self._sem.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "coalesced": self.coalesced,
+            "rejected_429": self.rejected,
+            "timed_out_503": self.timed_out,
+            "skipped_background": self.skipped,
+        }
+
+
+class AdmissionController:
+    """Registry of RouteLimits, one per limited route."""
+
+    def __init__(self):
+        self.routes: Dict[str, RouteLimit] = {}
+
+    def add(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int = 1) -> RouteLimit:
+        limit = RouteLimit(name, max_concurrent, max_queue, queue_timeout, retry_after)
+        self.routes[name] = limit
+        return limit
+
+    def __getitem__(self, name: str) -> RouteLimit:
+        return self.routes[name]
+
+    def snapshot(self) -> dict:
+        return {name: limit.snapshot() for name, limit in self.routes.items()}
@@ -0,0 +1,70 @@
+# backfill_counters.py
+"""
+Compute the denormalized per-student counters used by the ranking endpoint
+(counters.interactions / communications / open_tasks and last_active) from
+the existing subcollections. Interactions already compacted into rollups
+(see rollups.py) are counted from `rollup_totals`, and `last_active` falls
+back to the newest rollup, so it is safe to re-run after compaction; it
+overwrites the counters.
+"""
+import os
+from dotenv import load_dotenv
+import firebase_admin
+from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+load_dotenv(dotenv_path=".env")
+
+FIREBASE_SA_PATH = os.getenv("FIREBASE_SA_PATH", "./firebase_service_account.json")
+
+# Initialize Firebase
+if not firebase_admin._apps:
+    cred = credentials.Certificate(FIREBASE_SA_PATH)
+    firebase_admin.initialize_app(cred)
+db = firestore.client()
+
+BATCH_SIZE = 400
+
+def count(query):
+    """Server-side count aggregation (no documents are transferred)"""
+    return query.count().get()[0][0].value
+
+def counters_for_student(student_ref, student):
+    interactions = student_ref.collection("interactions")
+    compacted = (student.get("rollup_totals") or {}).get("total", 0)
+    updates = {
+        "counters": {
+            "interactions": count(interactions) + compacted,
+            "communications": count(student_ref.collection("communications")),
+            "open_tasks": count(student_ref.collection("tasks").where(filter=FieldFilter("status", "==", "open"))),
+        },
+    }
+    latest = list(interactions.order_by("ts", direction=firestore.Query.DESCENDING).limit(1).stream())
+    if latest:
+        updates["last_active"] = latest[0].to_dict().get("ts")
+    else:
+        rollups = list(student_ref.collection("interaction_rollups")
+                       .order_by("day", direction=firestore.Query.DESCENDING).limit(1).stream())
+        if rollups and rollups[0].to_dict().get("last_ts") is not None:
+            updates["last_active"] = rollups[0].to_dict()["last_ts"]
+    return updates
+
+def main():
+    batch = db.batch()
+    pending = 0
+    total = 0
+    for student in db.collection("students").select(["rollup_totals"]).stream():
+        batch.update(student.reference, counters_for_student(student.reference, student.to_dict() or {}))
+        pending += 1
+        total += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+            print(f"  → {total} students updated")
+    if pending:
+        batch.commit()
+    print(f"\n✅ Done! Backfilled counters for {total} students")
+
+if __name__ == "__main__":
+    main()
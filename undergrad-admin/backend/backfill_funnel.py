@@ -0,0 +1,49 @@
+# backfill_funnel.py
+"""
+Seed the funnel aggregates (see funnel.py) for students created before stage
+transitions were tracked. Each such student is recorded as entering their
+current stage now, so time-in-stage for them is measured from the backfill.
+Students that already have `stages_reached` are skipped, so it is safe to re-run.
+"""
+import os
+from dotenv import load_dotenv
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from funnel import stage_change
+
+load_dotenv(dotenv_path=".env")
+
+FIREBASE_SA_PATH = os.getenv("FIREBASE_SA_PATH", "./firebase_service_account.json")
+
+# Initialize Firebase
+if not firebase_admin._apps:
+    cred = credentials.Certificate(FIREBASE_SA_PATH)
+    firebase_admin.initialize_app(cred)
+db = firestore.client()
+
+STUDENTS_PER_BATCH = 100  # 4 writes per student
+
+def main():
+    batch = db.batch()
+    pending = 0
+    total = 0
+    for student in db.collection("students").stream():
+        data = student.to_dict()
+        if data.get("stages_reached"):
+            continue
+        status = data.get("application_status", "Exploring")
+        fields = stage_change(db, batch, student.id, {"created_at": data.get("created_at")}, status)
+        batch.update(student.reference, fields)
+        pending += 1
+        total += 1
+        if pending == STUDENTS_PER_BATCH:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    print(f"\n✅ Done! Backfilled funnel data for {total} students")
+
+if __name__ == "__main__":
+    main()
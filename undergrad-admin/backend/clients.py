@@ -0,0 +1,88 @@
+# backend/clients.py
+"""
+Lazily created Firebase / Firestore clients.
+
+Nothing here touches credentials or opens a gRPC channel until a route
+actually asks for the client, so importing the app (workers, tests, reloads)
+stays cheap and does not require the service-account file to exist.
+"""
+import importlib
+import threading
+import time
+from typing import Optional
+
+from fastapi import Request
+
+
+class _LazyModule:
+    """Module proxy that imports on first attribute access (firebase/grpc are slow to import)."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+firestore = _LazyModule("firebase_admin.firestore")
+auth = _LazyModule("firebase_admin.auth")
+
+
+class FirebaseClients:
+    """Holds the Firebase app and Firestore client, created on first use."""
+
+    def __init__(self, sa_path: str, instrument: bool = False):
+        self.sa_path = sa_path
+        self.instrument = instrument
+        self.init_ms: Optional[float] = None
+        self._db = None
+        self._app = None  # only set when this holder initialized the Firebase app
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._db is not None
+
+    @property
+    def db(self):
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._db = self._create_db()
+        return self._db
+
+    def _create_db(self):
+        start = time.perf_counter()
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if self.instrument:
+            from profiling import install_firestore_hooks
+            install_firestore_hooks()
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(self.sa_path)
+            self._app = firebase_admin.initialize_app(cred)
+        db = firestore.client()
+        self.init_ms = round((time.perf_counter() - start) * 1000, 1)
+        return db
+
+    def close(self):
+        with self._lock:
+            if self._app is not None:
+                import firebase_admin
+                firebase_admin.delete_app(self._app)
+                self._app = None
+            self._db = None
+
+
+def get_clients(request: Request) -> FirebaseClients:
+    """FastAPI dependency returning the app's FirebaseClients (without initializing them)."""
+    return request.app.state.clients
+
+
+def get_db(request: Request):
+    """FastAPI dependency returning the (lazily created) Firestore client."""
+    return request.app.state.clients.db
@@ -0,0 +1,34 @@
+# compact_interactions.py
+"""
+Fold interactions older than INTERACTION_RETENTION_DAYS into per-student
+daily rollups (see rollups.py). Set INTERACTION_ARCHIVE=true to copy the
+raw events into the interaction_archive collection before deleting them.
+Meant to run periodically (e.g. a nightly cron).
+"""
+import os
+from dotenv import load_dotenv
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from rollups import compact_all
+
+load_dotenv(dotenv_path=".env")
+
+FIREBASE_SA_PATH = os.getenv("FIREBASE_SA_PATH", "./firebase_service_account.json")
+INTERACTION_RETENTION_DAYS = int(os.getenv("INTERACTION_RETENTION_DAYS", "90"))
+INTERACTION_ARCHIVE = os.getenv("INTERACTION_ARCHIVE", "false").lower() == "true"
+
+# Initialize Firebase
+if not firebase_admin._apps:
+    cred = credentials.Certificate(FIREBASE_SA_PATH)
+    firebase_admin.initialize_app(cred)
+db = firestore.client()
+
+def main():
+    mode = "archiving" if INTERACTION_ARCHIVE else "deleting"
+    print(f"Compacting interactions older than {INTERACTION_RETENTION_DAYS} days ({mode} raw events)")
+    total = compact_all(db, INTERACTION_RETENTION_DAYS, archive=INTERACTION_ARCHIVE)
+    print(f"\n✅ Done! Compacted {total} interactions")
+
+if __name__ == "__main__":
+    main()
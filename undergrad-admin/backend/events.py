@@ -0,0 +1,193 @@
+# backend/events.py
+"""
+In-process buffer for interaction events posted to /api/events.
+
+Events are appended to a bounded in-memory buffer and written to
+students/{sid}/interactions by a background task, either every
+`flush_interval` seconds or as soon as `flush_size` events are waiting.
+Each flush uses batched writes (Firestore allows 500 writes per batch) and
+bumps every touched student's `last_active` and `counters.interactions`
+once; `last_active` only ever moves forward, so late or backfilled events
+don't make a student look less recently active. When the buffer is full,
+`offer()` refuses new events so the route can shed load. A failed flush
+is retried from the buffer, so delivery is at-least-once. Events whose
+student id can't name a document are dropped rather than retried, so one
+bad event can't wedge the buffer.
+"""
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from clients import firestore
+from rollups import as_utc
+
+logger = logging.getLogger("undergrad.events")
+
+MAX_BATCH_WRITES = 500
+
+
+def valid_student_id(sid) -> bool:
+    """Whether sid can be used as a document id in students/."""
+    return isinstance(sid, str) and sid not in ("", ".", "..") and "/" not in sid and len(sid.encode()) <= 1500
+
+
+class EventBuffer:
+    def __init__(self, clients, max_size: int = 50000, flush_size: int = 2000, flush_interval: float = 1.0,
+                 on_flush: Optional[Callable[[str], None]] = None):
+        self.clients = clients
+        self.on_flush = on_flush  # called with each student id a flush wrote to
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._events: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # counters
+        self.accepted = 0
+        self.rejected = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.unknown_student = 0
+        self.invalid_student = 0
+        self.dropped = 0
+
+    def offer(self, events: List[dict]) -> bool:
+        """Buffer events (all or nothing). Returns False when the buffer is full."""
+        if len(self._events) + len(events) > self.max_size:
+            self.rejected += len(events)
+            return False
+        self._events.extend(events)
+        self.accepted += len(events)
+        if len(self._events) >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # drain whatever is still buffered before shutting down
+        while self._events:
+            if not await self.flush():
+                break
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._events:
+                if not await self.flush() or len(self._events) < self.flush_size:
+                    break
+
+    async def flush(self) -> bool:
+        """Write up to flush_size buffered events. Returns False if the write failed."""
+        if not self._events:
+            return True
+        batch = self._events[:self.flush_size]
+        del self._events[:self.flush_size]
+        try:
+            await run_in_threadpool(self._write, batch)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("event flush of %d events failed", len(batch))
+            # put the events back if there is room; otherwise they are lost
+            room = self.max_size - len(self._events)
+            self._events[:0] = batch[:room]
+            self.dropped += max(0, len(batch) - room)
+            return False
+        self.flushes += 1
+        return True
+
+    def _write(self, events: List[dict]):
+        db = self.clients.db
+        students = db.collection("students")
+
+        # the route validates ids; anything else that slips through is dropped
+        # here instead of failing (and endlessly retrying) the whole flush
+        refs = {}
+        for sid in {e["student_id"] for e in events}:
+            try:
+                if valid_student_id(sid):
+                    refs[sid] = students.document(sid)
+            except ValueError:
+                pass
+
+        # one batched read to skip events for students that don't exist, so the
+        # last_active update never creates phantom student docs; it also gives
+        # the stored last_active, which a flush must not move backwards
+        stored_last_active = {}
+        for snap in db.get_all(list(refs.values()), field_paths=["last_active"]):
+            if snap.exists:
+                stored_last_active[snap.id] = as_utc((snap.to_dict() or {}).get("last_active"))
+
+        last_active = {}
+        counts = {}
+        batch = db.batch()
+        pending = 0
+        written = 0
+        for event in events:
+            sid = event["student_id"]
+            if sid not in refs:
+                self.invalid_student += 1
+                logger.warning("dropping event with invalid student id %r", sid)
+                continue
+            if sid not in stored_last_active:
+                self.unknown_student += 1
+                continue
+            doc = {"type": event["type"], "details": event.get("details") or "", "ts": event["ts"]}
+            batch.set(refs[sid].collection("interactions").document(), doc)
+            pending += 1
+            written += 1
+            counts[sid] = counts.get(sid, 0) + 1
+            if sid not in last_active or event["ts"] > last_active[sid]:
+                last_active[sid] = event["ts"]
+            if pending == MAX_BATCH_WRITES:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+
+        # denormalized last_active / counters, once per student per flush
+        for sid, ts in last_active.items():
+            updates = {"counters.interactions": firestore.Increment(counts[sid])}
+            stored = stored_last_active[sid]
+            if stored is None or as_utc(ts) > stored:
+                updates["last_active"] = ts
+            batch.update(refs[sid], updates)
+            pending += 1
+            if pending == MAX_BATCH_WRITES:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+        self.written += written
+        if self.on_flush is not None:
+            for sid in last_active:
+                self.on_flush(sid)
+
+    def snapshot(self) -> dict:
+        return {
+            "buffered": len(self._events),
+            "max_size": self.max_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "unknown_student": self.unknown_student,
+            "invalid_student": self.invalid_student,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,171 @@
+# backend/funnel.py
+"""
+Application-stage transition history and incrementally maintained funnel metrics.
+
+Every stage change writes students/{sid}/stage_transitions/{auto} and bumps
+counters in aggregate documents, in the same batch as the student update:
+
+    analytics/funnel
+        reached.{stage}          students that ever reached the stage (each counted once)
+        current.{stage}          students currently in the stage
+        exits.{stage}            transitions out of the stage
+        time_in_stage.{stage}.sum_s / .hist.{bucket}
+                                 time spent before leaving the stage (histogram
+                                 over HIST_BUCKETS_DAYS, used for the median)
+    analytics/funnel/cohorts/{YYYY-Www}
+        reached.{stage}          students from that signup week reaching the stage
+
+GET /api/analytics/funnel only reads these documents, never the students.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from clients import firestore
+from rollups import as_utc
+from scoring import STATUSES
+
+STAGES = STATUSES
+
+# upper bounds (days) of the time-in-stage histogram buckets; the last bucket is open
+HIST_BUCKETS_DAYS = [1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60, 90, 120, 180, 270, 365]
+OPEN_BUCKET = "inf"
+
+
+def _bucket(days: float) -> str:
+    for upper in HIST_BUCKETS_DAYS:
+        if days < upper:
+            return str(upper)
+    return OPEN_BUCKET
+
+
+def cohort_week(ts: datetime) -> str:
+    year, week, _ = ts.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _reached_through(stage: str) -> list:
+    # moving forward to a stage implies having passed the earlier ones
+    if stage in STAGES:
+        return STAGES[:STAGES.index(stage) + 1]
+    return [stage]
+
+
+def stage_change(db, batch, sid: str, student: dict, new_stage: str, now: Optional[datetime] = None) -> dict:
+    """
+    Add the transition record and aggregate updates for moving `student`
+    (its current document, or {} when just created) to `new_stage` to
+    `batch` (a WriteBatch or Transaction). Returns the fields to write onto
+    the student document.
+    """
+    now = now or datetime.now(timezone.utc)
+    old_stage = student.get("application_status") if student else None
+    entered_at = as_utc(student.get("stage_entered_at"))
+    cohort = student.get("funnel_cohort")
+    if cohort is None:
+        created = as_utc(student.get("created_at"))
+        cohort = cohort_week(created or now)
+    # students from before transitions were tracked (no stage_entered_at) were
+    # never counted in `current`, so there is nothing to move them out of;
+    # they are counted as reaching their old stage now, as the backfill would
+    tracked = entered_at is not None
+    already = set(student.get("stages_reached") or [])
+    reached = _reached_through(new_stage)
+    if old_stage and not tracked:
+        reached = _reached_through(old_stage) + reached
+    newly_reached = [s for s in dict.fromkeys(reached) if s not in already]
+
+    time_in_stage_s = (now - entered_at).total_seconds() if tracked and old_stage else None
+    transition = {"from": old_stage, "to": new_stage, "ts": now}
+    if time_in_stage_s is not None:
+        transition["time_in_stage_s"] = time_in_stage_s
+    batch.set(db.collection("students").document(sid).collection("stage_transitions").document(), transition)
+
+    funnel = {f"current.{new_stage}": firestore.Increment(1)}
+    for s in newly_reached:
+        funnel[f"reached.{s}"] = firestore.Increment(1)
+    if old_stage and tracked:
+        funnel[f"current.{old_stage}"] = firestore.Increment(-1)
+        funnel[f"exits.{old_stage}"] = firestore.Increment(1)
+        if time_in_stage_s is not None:
+            funnel[f"time_in_stage.{old_stage}.sum_s"] = firestore.Increment(time_in_stage_s)
+            funnel[f"time_in_stage.{old_stage}.hist.{_bucket(time_in_stage_s / 86400)}"] = firestore.Increment(1)
+    funnel_ref = db.collection("analytics").document("funnel")
+    batch.set(funnel_ref, _nest(funnel), merge=True)
+
+    if newly_reached:
+        batch.set(funnel_ref.collection("cohorts").document(cohort), _nest({
+            "week": cohort,
+            **{f"reached.{s}": firestore.Increment(1) for s in newly_reached},
+        }), merge=True)
+
+    fields = {"stage_entered_at": now, "funnel_cohort": cohort}
+    if newly_reached:
+        fields["stages_reached"] = firestore.ArrayUnion(newly_reached)
+    return fields
+
+
+def _nest(flat: dict) -> dict:
+    # set(merge=True) takes nested maps rather than dotted field paths
+    out = {}
+    for key, value in flat.items():
+        node = out
+        parts = key.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return out
+
+
+def median_days(hist: dict) -> Optional[float]:
+    """Median from the time-in-stage histogram, interpolating inside the median bucket."""
+    total = sum(hist.values())
+    if not total:
+        return None
+    half = total / 2
+    seen = 0
+    lower = 0
+    for upper in HIST_BUCKETS_DAYS + [OPEN_BUCKET]:
+        n = hist.get(str(upper), 0)
+        if seen + n >= half and n:
+            if upper == OPEN_BUCKET:
+                return float(lower)
+            return round(lower + (upper - lower) * (half - seen) / n, 1)
+        seen += n
+        if upper != OPEN_BUCKET:
+            lower = upper
+    return float(lower)
+
+
+def funnel_report(db, weeks: int = 12) -> dict:
+    funnel_ref = db.collection("analytics").document("funnel")
+    snap = funnel_ref.get()
+    data = (snap.to_dict() if snap.exists else None) or {}
+    reached = data.get("reached") or {}
+    current = data.get("current") or {}
+    exits = data.get("exits") or {}
+    time_in_stage = data.get("time_in_stage") or {}
+
+    stages = []
+    for i, stage in enumerate(STAGES):
+        tis = time_in_stage.get(stage) or {}
+        hist = tis.get("hist") or {}
+        n_timed = sum(hist.values())
+        nxt = STAGES[i + 1] if i + 1 < len(STAGES) else None
+        stages.append({
+            "stage": stage,
+            "reached": reached.get(stage, 0),
+            "current": current.get(stage, 0),
+            "exits": exits.get(stage, 0),
+            "conversion_to_next": (
+                round(reached.get(nxt, 0) / reached[stage], 3) if nxt and reached.get(stage) else None
+            ),
+            "median_days_in_stage": median_days(hist),
+            "mean_days_in_stage": round(tis.get("sum_s", 0) / n_timed / 86400, 1) if n_timed else None,
+        })
+
+    cohorts = []
+    for c in funnel_ref.collection("cohorts").order_by("week", direction=firestore.Query.DESCENDING).limit(weeks).stream():
+        d = c.to_dict()
+        cohorts.append({"week": d.get("week", c.id), "reached": d.get("reached") or {}})
+
+    return {"stages": stages, "cohorts": cohorts}
@@ -1,42 +1,75 @@
 # backend/main.py
+import math
 import os
-from fastapi import FastAPI, Header, HTTPException
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
-from pydantic import BaseModel
-from typing import Optional
-import requests
+from pydantic import BaseModel, field_validator
+from typing import List, Literal, Optional, Union
 from datetime import datetime, timezone
 from fastapi import Body, Path
-from google.cloud.firestore_v1 import DocumentSnapshot
 from datetime import datetime as _dt
 import random
+import re
+from admission import AdmissionController
+from clients import FirebaseClients, auth, firestore, get_clients, get_db
+from events import EventBuffer, valid_student_id
+from funnel import funnel_report, stage_change
+from prefetch import Prefetcher, WarmCache
+from scoring import ENGAGEMENT_LEVELS, STATUSES, CohortCache, engagement_level, priority_score, rank_cohort
+from profiling import SlowRequestMiddleware
 
 load_dotenv(dotenv_path=".env")
 
 FIREBASE_SA_PATH = os.getenv("FIREBASE_SA_PATH", "./firebase_service_account.json")
+# create the Firestore client during startup instead of on the first request
+FIREBASE_EAGER_INIT = os.getenv("FIREBASE_EAGER_INIT", "false").lower() == "true"
 DEV_MODE = os.getenv("DEV_MODE", "true").lower() == "true"
 CUSTIO_API_KEY = os.getenv("CUSTIO_API_KEY", "mock")
 CUSTIO_API_URL = os.getenv("CUSTIO_API_URL", "https://api.customer.io/v1/send-mock")
 
-# init firebase admin
-if not firebase_admin._apps:
-    cred = credentials.Certificate(FIREBASE_SA_PATH)
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-app = FastAPI(title="Undergrad Admin API")
-
-# allow frontend localhost (Next dev) and others
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # narrow this in prod
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# slow-request logging / profiling (see profiling.py)
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))  # 0 disables
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")  # send as X-Profile header
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))  # oldest profiles are deleted beyond this
+PROFILING_ENABLED = SLOW_REQUEST_MS > 0 or PROFILE_SAMPLE_RATE > 0 or bool(PROFILE_ADMIN_TOKEN)
+
+# admission control for expensive routes (see admission.py)
+STATS_MAX_CONCURRENCY = int(os.getenv("STATS_MAX_CONCURRENCY", "2"))
+STATS_MAX_QUEUE = int(os.getenv("STATS_MAX_QUEUE", "8"))
+AI_SUMMARY_MAX_CONCURRENCY = int(os.getenv("AI_SUMMARY_MAX_CONCURRENCY", "8"))
+AI_SUMMARY_MAX_QUEUE = int(os.getenv("AI_SUMMARY_MAX_QUEUE", "32"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "5"))
+ADMISSION_RETRY_AFTER_S = int(os.getenv("ADMISSION_RETRY_AFTER_S", "2"))
+
+# interaction event ingestion (see events.py)
+EVENT_BUFFER_MAX = int(os.getenv("EVENT_BUFFER_MAX", "50000"))
+EVENT_FLUSH_SIZE = int(os.getenv("EVENT_FLUSH_SIZE", "2000"))
+EVENT_FLUSH_INTERVAL_S = float(os.getenv("EVENT_FLUSH_INTERVAL_S", "1"))
+
+# "who to contact next" ranking (see scoring.py)
+RANKING_CACHE_TTL_S = float(os.getenv("RANKING_CACHE_TTL_S", "60"))
+RANKED_MAX_CONCURRENCY = int(os.getenv("RANKED_MAX_CONCURRENCY", "2"))
+RANKED_MAX_QUEUE = int(os.getenv("RANKED_MAX_QUEUE", "8"))
+
+# warming of the student detail view from the list page (see prefetch.py).
+# The cache is per process and only the process handling a write invalidates
+# it, so it is off by default when running several workers.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "12"))  # 0 disables
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "4"))
+WARM_CACHE_TTL_S = float(os.getenv("WARM_CACHE_TTL_S", "60" if WEB_CONCURRENCY <= 1 else "0"))  # 0 disables
+WARM_CACHE_MAX = int(os.getenv("WARM_CACHE_MAX", "2000"))
+
+router = APIRouter()
 
 def verify_token(auth_header: Optional[str]):
     if DEV_MODE:
@@ -50,54 +83,161 @@ def verify_token(auth_header: Optional[str]):
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-@app.get("/api/health")
-async def health():
-    return {"status": "ok", "time": datetime.now(timezone.utc).isoformat()}
+def bump_counters(db, sid: str, **deltas):
+    """Increment denormalized per-student counters (see scoring.py); no-op for unknown students."""
+    from google.api_core.exceptions import NotFound
+    updates = {f"counters.{name}": firestore.Increment(n) for name, n in deltas.items() if n}
+    if not updates:
+        return
+    try:
+        db.collection("students").document(sid).update(updates)
+    except NotFound:
+        pass
+
+def get_warm_cache(request: Request) -> WarmCache:
+    return request.app.state.warm_cache
+
+@router.get("/api/health")
+async def health(request: Request, clients: FirebaseClients = Depends(get_clients)):
+    return {
+        "status": "ok",
+        "time": datetime.now(timezone.utc).isoformat(),
+        "startup": {
+            **request.app.state.startup,
+            "firestore_initialized": clients.initialized,
+            "firestore_init_ms": clients.init_ms,
+        },
+    }
 
-@app.get("/api/students")
-async def list_students(q: Optional[str] = None, status: Optional[str] = None):
+def _csv(val: Optional[str]) -> Optional[list]:
+    """Parse a comma-separated query parameter (None when absent)."""
+    if val is None:
+        return None
+    return [x.strip() for x in val.split(",") if x.strip()]
+
+# unquoted Firestore field paths, e.g. `name` or `counters.open_tasks`
+_FIELD_PATH = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+def _fields_param(fields: Optional[str]) -> Optional[list]:
+    """Parse `fields=`, rejecting names that aren't valid field paths (400)."""
+    wanted = _csv(fields)
+    invalid = [f for f in wanted or [] if not _FIELD_PATH.fullmatch(f)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid)}")
+    return wanted
+
+# list fields computed per request, and the stored fields each one needs
+STUDENT_DERIVED_FIELDS = {
+    "last_active": ["last_active"],
+    "last_comm_ts": [],
+    "not_contacted_7days": [],
+    "high_intent": ["application_status"],
+    "needs_essay_help": ["needs_essay_help"],
+}
+
+@router.get("/api/students")
+async def list_students(request: Request, q: Optional[str] = None, status: Optional[str] = None, fields: Optional[str] = None, db=Depends(get_db)):
+    """
+    List students. `fields=name,email,...` returns only those fields (plus
+    id): stored fields are projected with select() and the per-student
+    subcollection lookups run only for the derived fields that need them.
+    """
     coll = db.collection("students")
-    docs = coll.limit(100).get()
+    wanted = _fields_param(fields)
+    query = coll
+    if wanted is not None:
+        stored = set()
+        for f in wanted:
+            if f in STUDENT_DERIVED_FIELDS:
+                stored.update(STUDENT_DERIVED_FIELDS[f])
+            elif f != "id":
+                stored.add(f)
+        query = coll.select(sorted(stored))
+    need_last_active = wanted is None or "last_active" in wanted
+    need_last_comm = wanted is None or "last_comm_ts" in wanted or "not_contacted_7days" in wanted
+
+    docs = query.limit(100).get()
     results = []
     now = datetime.utcnow()  # for quick filter calculations
     for d in docs:
         data = d.to_dict()
         data["id"] = d.id
 
-        # Fetch latest interaction timestamp
-        interactions = list(
-            db.collection("students").document(d.id)
-            .collection("interactions")
-            .order_by("ts", direction=firestore.Query.DESCENDING)
-            .limit(1)
-            .stream()
-        )
-        if interactions:
-            data["last_active"] = interactions[0].to_dict().get("ts")
-        else:
-            data["last_active"] = None
+        # Latest interaction timestamp: the denormalized field kept by the event
+        # flush / backfill_counters.py survives compaction of the raw history;
+        # fall back to the newest raw interaction for students without it
+        if need_last_active and data.get("last_active") is None:
+            interactions = list(
+                db.collection("students").document(d.id)
+                .collection("interactions")
+                .order_by("ts", direction=firestore.Query.DESCENDING)
+                .limit(1)
+                .stream()
+            )
+            if interactions:
+                data["last_active"] = interactions[0].to_dict().get("ts")
+            else:
+                data["last_active"] = None
 
         # Fetch latest communication timestamp
-        comms = list(
-            db.collection("students").document(d.id)
-            .collection("communications")
-            .order_by("ts", direction=firestore.Query.DESCENDING)
-            .limit(1)
-            .stream()
-        )
-        last_comm_ts = comms[0].to_dict().get("ts") if comms else None
-        data["last_comm_ts"] = last_comm_ts
-
-        # Quick filter flags
-        data["not_contacted_7days"] = (
-            last_comm_ts is None or (now - last_comm_ts.replace(tzinfo=None)).days > 7
-        )
+        if need_last_comm:
+            comms = list(
+                db.collection("students").document(d.id)
+                .collection("communications")
+                .order_by("ts", direction=firestore.Query.DESCENDING)
+                .limit(1)
+                .stream()
+            )
+            last_comm_ts = comms[0].to_dict().get("ts") if comms else None
+            data["last_comm_ts"] = last_comm_ts
+
+            # Quick filter flags
+            data["not_contacted_7days"] = (
+                last_comm_ts is None or (now - last_comm_ts.replace(tzinfo=None)).days > 7
+            )
         data["high_intent"] = data.get("application_status") in ["Applying", "Submitted"]
         data["needs_essay_help"] = data.get("needs_essay_help", False)
 
+        if wanted is not None:
+            # dotted paths come back nested under their top-level field
+            keep = dict.fromkeys(["id", *(f.split(".")[0] for f in wanted)])
+            data = {k: data[k] for k in keep if k in data}
         results.append(data)
+
+    # warm the detail view for the cards the user is most likely to open
+    request.app.state.prefetcher.enqueue([r["id"] for r in results])
     return {"students": results}
 
+def compute_ranking(db, cohort: CohortCache, limit: int) -> dict:
+    cols = cohort.get(db)
+    top, priority, engagement = rank_cohort(cols, limit)
+    students = []
+    for i in top:
+        students.append({
+            "id": cols.ids[i],
+            "name": cols.names[i],
+            "application_status": STATUSES[cols.status[i]] if cols.status[i] >= 0 else None,
+            "priority_score": int(priority[i]),
+            "engagement_level": ENGAGEMENT_LEVELS[engagement[i]],
+            "last_active": None if math.isnan(cols.last_active[i])
+                else datetime.fromtimestamp(cols.last_active[i], timezone.utc).isoformat(),
+            "key_metrics": {
+                "total_interactions": int(cols.interactions[i]),
+                "communications": int(cols.communications[i]),
+                "open_tasks": int(cols.open_tasks[i]),
+            },
+        })
+    return {"total": len(cols), "students": students}
+
+@router.get("/api/students/ranked")
+async def ranked_students(request: Request, limit: int = Query(20, ge=1, le=500), db=Depends(get_db)):
+    """
+    Students to contact next, highest priority first (longest inactive
+    first within a priority). Scores every student in one vectorized pass.
+    """
+    state = request.app.state
+    return await state.admission["ranked"].run(limit, compute_ranking, db, state.cohort, limit)
+
 def _ts_to_iso(val):
     """Convert Firestore timestamp-like values to ISO string for JSON safely."""
     if val is None:
@@ -115,86 +255,139 @@ def _ts_to_iso(val):
     # Fallback: return as-is (shouldn't usually happen)
     return val
 
-@app.get("/api/students/{sid}")
-async def get_student(sid: str):
+# sections of the student detail payload that can be requested with include=
+STUDENT_SECTIONS = ["interactions", "interaction_rollups", "communications", "notes", "tasks"]
+
+def fetch_student_detail(db, sid: str, sections=STUDENT_SECTIONS, wanted: Optional[list] = None) -> dict:
     # fetch main student doc
-    doc_snap = db.collection("students").document(sid).get()
+    doc_snap = db.collection("students").document(sid).get(field_paths=wanted)
     if not doc_snap.exists:
         raise HTTPException(status_code=404, detail="Student not found")
     student = doc_snap.to_dict()
     student["id"] = sid
+    payload = {"student": student}
 
     # --- interactions ---
-    interactions = []
-    for x in db.collection("students").document(sid).collection("interactions")\
-            .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
-        d = x.to_dict()
-        d["id"] = x.id
-        # normalize ts
-        if "ts" in d:
-            d["ts"] = _ts_to_iso(d["ts"])
-        interactions.append(d)
+    if "interactions" in sections:
+        interactions = []
+        for x in db.collection("students").document(sid).collection("interactions")\
+                .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
+            d = x.to_dict()
+            d["id"] = x.id
+            # normalize ts
+            if "ts" in d:
+                d["ts"] = _ts_to_iso(d["ts"])
+            interactions.append(d)
+        payload["interactions"] = interactions
+
+    # --- daily rollups of compacted interactions (newest first) ---
+    if "interaction_rollups" in sections:
+        interaction_rollups = []
+        for x in db.collection("students").document(sid).collection("interaction_rollups")\
+                .order_by("day", direction=firestore.Query.DESCENDING).limit(30).stream():
+            d = x.to_dict()
+            for k in ("first_ts", "last_ts"):
+                if k in d:
+                    d[k] = _ts_to_iso(d[k])
+            interaction_rollups.append(d)
+        payload["interaction_rollups"] = interaction_rollups
 
     # --- communications ---
-    communications = []
-    for x in db.collection("students").document(sid).collection("communications")\
-            .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
-        d = x.to_dict()
-        d["id"] = x.id
-        if "ts" in d:
-            d["ts"] = _ts_to_iso(d["ts"])
-        communications.append(d)
+    if "communications" in sections:
+        communications = []
+        for x in db.collection("students").document(sid).collection("communications")\
+                .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
+            d = x.to_dict()
+            d["id"] = x.id
+            if "ts" in d:
+                d["ts"] = _ts_to_iso(d["ts"])
+            communications.append(d)
+        payload["communications"] = communications
 
     # --- notes ---
-    notes = []
-    for x in db.collection("students").document(sid).collection("notes")\
-            .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
-        d = x.to_dict()
-        d["id"] = x.id
-        if "ts" in d:
-            d["ts"] = _ts_to_iso(d["ts"])
-        notes.append(d)
+    if "notes" in sections:
+        notes = []
+        for x in db.collection("students").document(sid).collection("notes")\
+                .order_by("ts", direction=firestore.Query.DESCENDING).limit(50).stream():
+            d = x.to_dict()
+            d["id"] = x.id
+            if "ts" in d:
+                d["ts"] = _ts_to_iso(d["ts"])
+            notes.append(d)
+        payload["notes"] = notes
 
     # --- tasks ---
-    tasks = []
-    for x in db.collection("students").document(sid).collection("tasks")\
-            .order_by("created_at", direction=firestore.Query.DESCENDING).limit(50).stream():
-        d = x.to_dict()
-        d["id"] = x.id
-        if "created_at" in d:
-            d["created_at"] = _ts_to_iso(d["created_at"])
-        tasks.append(d)
+    if "tasks" in sections:
+        tasks = []
+        for x in db.collection("students").document(sid).collection("tasks")\
+                .order_by("created_at", direction=firestore.Query.DESCENDING).limit(50).stream():
+            d = x.to_dict()
+            d["id"] = x.id
+            if "created_at" in d:
+                d["created_at"] = _ts_to_iso(d["created_at"])
+            tasks.append(d)
+        payload["tasks"] = tasks
+
+    # Full payload expected by frontend unless include= narrowed it
+    return payload
+
+@router.get("/api/students/{sid}")
+async def get_student(
+    sid: str,
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    db=Depends(get_db),
+    cache: WarmCache = Depends(get_warm_cache),
+):
+    """
+    Student detail. `fields=a,b` projects the student document and
+    `include=notes,tasks` limits which subcollections are fetched
+    (default: all of STUDENT_SECTIONS; an empty `include=` fetches none).
+    Served from the warm cache (see prefetch.py) when the full detail is
+    already there.
+    """
+    sections = STUDENT_SECTIONS if include is None else _csv(include)
+    unknown = [x for x in sections if x not in STUDENT_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown include: {', '.join(unknown)}")
+    wanted = _fields_param(fields)
+
+    if wanted is None:
+        cached = cache.get(("detail", sid))
+        if cached is not None:
+            return {"student": cached["student"], **{k: cached[k] for k in sections}}
+
+    version = cache.version(sid)
+    payload = fetch_student_detail(db, sid, sections, wanted)
+    if wanted is None and sections is STUDENT_SECTIONS:
+        cache.put(("detail", sid), payload, version)
+    return payload
 
-    # Return full payload expected by frontend
-    return {
-        "student": student,
-        "interactions": interactions,
-        "communications": communications,
-        "notes": notes,
-        "tasks": tasks,
-    }
 class NoteIn(BaseModel):
     author: str
     text: str
 
-@app.post("/api/students/{sid}/notes")
-async def add_note(sid: str, note: NoteIn, authorization: Optional[str] = Header(None)):
+@router.post("/api/students/{sid}/notes")
+async def add_note(sid: str, note: NoteIn, authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     user = verify_token(authorization)
     note_doc = {"author": note.author, "text": note.text, "ts": firestore.SERVER_TIMESTAMP}
     col = db.collection("students").document(sid).collection("notes")
     ref = col.add(note_doc)
+    cache.invalidate(sid)
     return {"ok": True, "id": ref[1].id}
 
 class NoteUpdateIn(BaseModel):
     author: Optional[str] = None
     text: Optional[str] = None
 
-@app.patch("/api/students/{sid}/notes/{nid}")
+@router.patch("/api/students/{sid}/notes/{nid}")
 async def update_note(
     sid: str,
     nid: str,
     note_updates: NoteUpdateIn,
     authorization: Optional[str] = Header(None),
+    db=Depends(get_db),
+    cache: WarmCache = Depends(get_warm_cache),
 ):
     """
     Update an existing note in students/{sid}/notes/{nid}.
@@ -216,10 +409,11 @@ async def update_note(
         note_ref.update(updates)
     updated = note_ref.get().to_dict()
     updated["id"] = nid
+    cache.invalidate(sid)
     return {"ok": True, "note": updated}
 
-@app.delete("/api/students/{sid}/notes/{nid}")
-async def delete_note(sid: str, nid: str, authorization: Optional[str] = Header(None)):
+@router.delete("/api/students/{sid}/notes/{nid}")
+async def delete_note(sid: str, nid: str, authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     """
     Delete a note from students/{sid}/notes/{nid}.
     """
@@ -229,6 +423,7 @@ async def delete_note(sid: str, nid: str, authorization: Optional[str] = Header(
     if not note_doc.exists:
         raise HTTPException(status_code=404, detail="Note not found")
     note_ref.delete()
+    cache.invalidate(sid)
     return {"ok": True, "id": nid}
 
 class CommIn(BaseModel):
@@ -236,16 +431,18 @@ class CommIn(BaseModel):
     body: str
     logged_by: str
 
-@app.post("/api/students/{sid}/communications")
-async def add_communication(sid: str, comm: CommIn, authorization: Optional[str] = Header(None)):
+@router.post("/api/students/{sid}/communications")
+async def add_communication(sid: str, comm: CommIn, authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     user = verify_token(authorization)
     doc = {"channel": comm.channel, "body": comm.body, "logged_by": comm.logged_by, "ts": firestore.SERVER_TIMESTAMP}
     col = db.collection("students").document(sid).collection("communications")
     ref = col.add(doc)
+    bump_counters(db, sid, communications=1)
+    cache.invalidate(sid)
     return {"ok": True, "id": ref[1].id}
 
-@app.post("/api/students/{sid}/trigger-email")
-async def trigger_email(sid: str, subject: str = Body(...), body: str = Body(...), authorization: Optional[str] = Header(None)):
+@router.post("/api/students/{sid}/trigger-email")
+async def trigger_email(sid: str, subject: str = Body(...), body: str = Body(...), authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     user = verify_token(authorization)
     # Mock email sending - in production, integrate with Customer.io or similar
     # For now, we'll just log the communication
@@ -256,8 +453,10 @@ async def trigger_email(sid: str, subject: str = Body(...), body: str = Body(...
         "ts": firestore.SERVER_TIMESTAMP
     }
     db.collection("students").document(sid).collection("communications").add(comm_doc)
+    bump_counters(db, sid, communications=1)
     
     # Return success with mock response
+    cache.invalidate(sid)
     return {
         "ok": True, 
         "message": "Email queued successfully (mock)",
@@ -274,33 +473,50 @@ class StudentIn(BaseModel):
     country: str
     application_status: str
 
-@app.post("/api/students")
-async def create_student(student: StudentIn, authorization: Optional[str] = Header(None)):
+@router.post("/api/students")
+async def create_student(student: StudentIn, authorization: Optional[str] = Header(None), db=Depends(get_db)):
     user = verify_token(authorization)
     doc_ref = db.collection("students").document()  # Auto-ID
-    doc_ref.set(student.dict())
+    batch = db.batch()
+    stage_fields = stage_change(db, batch, doc_ref.id, {}, student.application_status)
+    batch.set(doc_ref, {**student.dict(), **stage_fields})
+    batch.commit()
     return {"ok": True, "student": {**student.dict(), "id": doc_ref.id}}
 
-@app.patch("/api/students/{sid}")
-async def update_student(sid: str, updates: dict = Body(...), authorization: Optional[str] = Header(None)):
+@router.patch("/api/students/{sid}")
+async def update_student(sid: str, updates: dict = Body(...), authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     user = verify_token(authorization)
     doc_ref = db.collection("students").document(sid)
-    if not doc_ref.get().exists:
-        raise HTTPException(status_code=404, detail="Student not found")
-    doc_ref.update(updates)
+
+    # read and write in one transaction so concurrent stage changes can't
+    # both count the transition out of the same old stage
+    @firestore.transactional
+    def apply(transaction):
+        snap = doc_ref.get(transaction=transaction)
+        if not snap.exists:
+            raise HTTPException(status_code=404, detail="Student not found")
+        current = snap.to_dict()
+        new_stage = updates.get("application_status")
+        fields = updates
+        if new_stage and new_stage != current.get("application_status"):
+            # record the transition and funnel aggregates atomically with the update
+            fields = {**updates, **stage_change(db, transaction, sid, current, new_stage)}
+        transaction.update(doc_ref, fields)
+
+    apply(db.transaction())
     updated_student = doc_ref.get().to_dict()
     updated_student["id"] = sid
+    cache.invalidate(sid)
     return {"ok": True, "student": updated_student}
 
-@app.get("/api/stats")
-async def get_stats():
+def compute_stats(db) -> dict:
     coll = db.collection("students")
     docs = coll.get()
     total = len(docs)
     stages = {"Exploring": 0, "Shortlisting": 0, "Applying": 0, "Submitted": 0}
     not_contacted_7days = 0
     needs_essay_help = 0
-    now = datetime.datetime.utcnow()
+    now = datetime.utcnow()
 
     for d in docs:
         data = d.to_dict()
@@ -324,6 +540,11 @@ async def get_stats():
         "needs_essay_help": needs_essay_help
     }
 
+@router.get("/api/stats")
+async def get_stats(request: Request, db=Depends(get_db)):
+    # full collection scan: concurrent callers share one in-flight computation
+    return await request.app.state.admission["stats"].run("stats", compute_stats, db)
+
 class TaskUpdateIn(BaseModel):
     title: Optional[str] = None
     due_at: Optional[str] = None
@@ -331,12 +552,14 @@ class TaskUpdateIn(BaseModel):
     assigned_to: Optional[str] = None
     status: Optional[str] = None
 
-@app.patch("/api/students/{sid}/tasks/{tid}")
+@router.patch("/api/students/{sid}/tasks/{tid}")
 async def update_task(
     sid: str,
     tid: str,
     task_updates: TaskUpdateIn,
     authorization: Optional[str] = Header(None),
+    db=Depends(get_db),
+    cache: WarmCache = Depends(get_warm_cache),
 ):
     """
     Update an existing task. Partial updates supported.
@@ -362,18 +585,24 @@ async def update_task(
     if updates:
         updates["updated_at"] = firestore.SERVER_TIMESTAMP
         task_ref.update(updates)
+        if "status" in updates:
+            was_open = task_doc.to_dict().get("status") == "open"
+            bump_counters(db, sid, open_tasks=int(updates["status"] == "open") - int(was_open))
     
     updated = task_ref.get().to_dict()
     updated["id"] = tid
     if "updated_at" in updated:
         updated["updated_at"] = _ts_to_iso(updated["updated_at"])
+    cache.invalidate(sid)
     return {"ok": True, "task": updated}
 
-@app.delete("/api/students/{sid}/tasks/{tid}")
+@router.delete("/api/students/{sid}/tasks/{tid}")
 async def delete_task(
     sid: str,
     tid: str,
     authorization: Optional[str] = Header(None),
+    db=Depends(get_db),
+    cache: WarmCache = Depends(get_warm_cache),
 ):
     """
     Delete a task.
@@ -384,6 +613,9 @@ async def delete_task(
     if not task_doc.exists:
         raise HTTPException(status_code=404, detail="Task not found")
     task_ref.delete()
+    if task_doc.to_dict().get("status") == "open":
+        bump_counters(db, sid, open_tasks=-1)
+    cache.invalidate(sid)
     return {"ok": True, "id": tid}
 
 class TaskIn(BaseModel):
@@ -393,8 +625,8 @@ class TaskIn(BaseModel):
     assigned_to: Optional[str] = None
     priority: Optional[str] = "medium"  # low, medium, high
 
-@app.post("/api/students/{sid}/tasks")
-async def add_task(sid: str, task: TaskIn, authorization: Optional[str] = Header(None)):
+@router.post("/api/students/{sid}/tasks")
+async def add_task(sid: str, task: TaskIn, authorization: Optional[str] = Header(None), db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
     user = verify_token(authorization)
     doc = {
         "title": task.title,
@@ -407,6 +639,8 @@ async def add_task(sid: str, task: TaskIn, authorization: Optional[str] = Header
         "priority": task.priority or "medium"
     }
     ref = db.collection("students").document(sid).collection("tasks").add(doc)
+    bump_counters(db, sid, open_tasks=1)
+    cache.invalidate(sid)
     return {"ok": True, "id": ref[1].id}
 
 def generate_ai_summary(student_data: dict, interactions: list, communications: list, notes: list, tasks: list) -> dict:
@@ -420,7 +654,9 @@ def generate_ai_summary(student_data: dict, interactions: list, communications:
     country = student_data.get("country", "Unknown")
     
     # Analyze activity levels
-    num_interactions = len(interactions)
+    # interactions compacted into daily rollups (see rollups.py) only survive as totals
+    rolled_up = student_data.get("rollup_totals") or {}
+    num_interactions = len(interactions) + rolled_up.get("total", 0)
     num_communications = len(communications)
     num_notes = len(notes)
     num_tasks = len(tasks)
@@ -449,12 +685,7 @@ def generate_ai_summary(student_data: dict, interactions: list, communications:
     
     # Engagement level
     total_activity = num_interactions + num_communications
-    if total_activity > 10:
-        engagement = "highly engaged"
-    elif total_activity > 5:
-        engagement = "moderately engaged"
-    else:
-        engagement = "needs more engagement"
+    engagement = engagement_level(total_activity)
     
     # Status-based insights
     status_insights = {
@@ -508,9 +739,10 @@ def generate_ai_summary(student_data: dict, interactions: list, communications:
     
     # AI questions analysis
     ai_questions = [i for i in interactions if i.get("type") == "ai_question"]
-    if len(ai_questions) > 3:
+    num_ai_questions = len(ai_questions) + (rolled_up.get("counts") or {}).get("ai_question", 0)
+    if num_ai_questions > 3:
         question_note = "Actively seeking guidance through AI assistant."
-    elif len(ai_questions) > 0:
+    elif num_ai_questions > 0:
         question_note = "Has used AI assistant for questions."
     else:
         question_note = "Has not yet engaged with AI assistant."
@@ -529,13 +761,7 @@ def generate_ai_summary(student_data: dict, interactions: list, communications:
         recommendations.append("Review and prioritize multiple pending tasks")
     
     # Priority score (1-5)
-    priority = 3  # default
-    if status in ["Applying", "Submitted"] and recent_interactions == 0:
-        priority = 5  # high
-    elif open_tasks > 2 or num_communications == 0:
-        priority = 4
-    elif status == "Exploring" and total_activity < 3:
-        priority = 2
+    priority = priority_score(status, recent_interactions, open_tasks, num_communications, total_activity)
     
     # Build final summary
     summary_text = (
@@ -554,16 +780,12 @@ def generate_ai_summary(student_data: dict, interactions: list, communications:
             "recent_activity": recent_interactions,
             "communications": num_communications,
             "open_tasks": open_tasks,
-            "ai_questions_asked": len(ai_questions)
+            "ai_questions_asked": num_ai_questions
         },
         "generated_at": datetime.now(tz.utc).isoformat()
     }
 
-@app.get("/api/students/{sid}/ai-summary")
-async def get_ai_summary(sid: str):
-    """
-    Generate an AI-powered summary of the student's profile and activity.
-    """
+def build_ai_summary(db, sid: str) -> dict:
     # Fetch student data
     doc_snap = db.collection("students").document(sid).get()
     if not doc_snap.exists:
@@ -571,9 +793,11 @@ async def get_ai_summary(sid: str):
     
     student = doc_snap.to_dict()
     
-    # Fetch all activity data
+    # Fetch activity data. Raw interactions only cover the retention window;
+    # older ones were compacted into student["rollup_totals"].
     interactions = []
-    for x in db.collection("students").document(sid).collection("interactions").stream():
+    for x in db.collection("students").document(sid).collection("interactions")\
+            .select(["type", "ts"]).stream():
         d = x.to_dict()
         interactions.append(d)
     
@@ -601,6 +825,86 @@ async def get_ai_summary(sid: str):
         "ai_summary": summary
     }
 
+@router.get("/api/students/{sid}/ai-summary")
+async def get_ai_summary(sid: str, request: Request, db=Depends(get_db), cache: WarmCache = Depends(get_warm_cache)):
+    """
+    Generate an AI-powered summary of the student's profile and activity.
+    Concurrent requests for the same student share one computation, and
+    summaries warmed by the list prefetch are served from memory.
+    """
+    cached = cache.get(("ai_summary", sid))
+    if cached is not None:
+        return cached
+    version = cache.version(sid)
+    # keyed on the version too, so a request after a write never joins (and
+    # caches) a computation that started before it
+    result = await request.app.state.admission["ai_summary"].run((sid, version), build_ai_summary, db, sid)
+    cache.put(("ai_summary", sid), result, version)
+    return result
+
+class EventIn(BaseModel):
+    student_id: str
+    type: Literal["login", "ai_question", "document_submitted"]
+    details: Optional[str] = None
+    ts: Optional[datetime] = None  # defaults to (and is capped at) the time the server received it
+
+    @field_validator("student_id")
+    @classmethod
+    def _valid_document_id(cls, v: str) -> str:
+        # must be usable as students/{student_id}, or the whole flush would fail
+        if not valid_student_id(v):
+            raise ValueError("student_id must be a non-empty Firestore document id without '/'")
+        return v
+
+@router.post("/api/events", status_code=202)
+async def ingest_events(
+    request: Request,
+    events: Union[EventIn, List[EventIn]] = Body(...),
+    authorization: Optional[str] = Header(None),
+):
+    """
+    Accept one interaction event or an array of them. Events are buffered
+    and written in batches shortly after; 503 means the buffer is full.
+    """
+    user = verify_token(authorization)
+    if isinstance(events, EventIn):
+        events = [events]
+    now = datetime.now(timezone.utc)
+    docs = []
+    for e in events:
+        ts = e.ts or now
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        # a client clock running ahead would otherwise pin last_active (which
+        # only moves forward) in the future and hide the student from ranking
+        ts = min(ts, now)
+        docs.append({"student_id": e.student_id, "type": e.type, "details": e.details, "ts": ts})
+    buffer = request.app.state.events
+    if not buffer.offer(docs):
+        raise HTTPException(
+            status_code=503,
+            detail="Event buffer is full, retry shortly",
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER_S)},
+        )
+    return {"ok": True, "accepted": len(docs)}
+
+@router.get("/api/analytics/funnel")
+async def get_funnel(weeks: int = Query(12, ge=1, le=104), db=Depends(get_db)):
+    """
+    Stage funnel: students reaching each stage, conversion to the next stage,
+    median/mean days in stage and weekly signup cohorts. Served from the
+    aggregate documents maintained by stage changes (see funnel.py).
+    """
+    return funnel_report(db, weeks)
+
+@router.get("/api/metrics")
+async def metrics(request: Request):
+    return {
+        "admission": request.app.state.admission.snapshot(),
+        "events": request.app.state.events.snapshot(),
+        "prefetch": request.app.state.prefetcher.snapshot(),
+    }
+
 # In your backend/main.py, update the verify_token function:
 def verify_token(auth_header: Optional[str]):
     if DEV_MODE:
@@ -612,4 +916,90 @@ def verify_token(auth_header: Optional[str]):
     
     # In production, this would verify Firebase tokens
     # For demo, we'll accept any token
-    return {"uid": "demo-user", "email": "demo@undergraduation.com"}
\ No newline at end of file
+    return {"uid": "demo-user", "email": "demo@undergraduation.com"}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    clients = app.state.clients
+    if FIREBASE_EAGER_INIT:
+        # pay credential loading / channel setup before taking traffic
+        await run_in_threadpool(lambda: clients.db)
+    await app.state.events.start()
+    await app.state.prefetcher.start()
+    yield
+    await app.state.prefetcher.stop()
+    await app.state.events.stop()
+    clients.close()
+
+def create_app(clients: Optional[FirebaseClients] = None) -> FastAPI:
+    """
+    Build the API. Firebase is not touched here; the Firestore client is
+    created on first use (or at startup with FIREBASE_EAGER_INIT=true).
+    """
+    started = time.perf_counter()
+    app = FastAPI(title="Undergrad Admin API", lifespan=lifespan)
+    app.state.clients = clients or FirebaseClients(FIREBASE_SA_PATH, instrument=PROFILING_ENABLED)
+
+    admission = AdmissionController()
+    admission.add("stats", STATS_MAX_CONCURRENCY, STATS_MAX_QUEUE,
+                  ADMISSION_QUEUE_TIMEOUT_S, ADMISSION_RETRY_AFTER_S)
+    admission.add("ranked", RANKED_MAX_CONCURRENCY, RANKED_MAX_QUEUE,
+                  ADMISSION_QUEUE_TIMEOUT_S, ADMISSION_RETRY_AFTER_S)
+    admission.add("ai_summary", AI_SUMMARY_MAX_CONCURRENCY, AI_SUMMARY_MAX_QUEUE,
+                  ADMISSION_QUEUE_TIMEOUT_S, ADMISSION_RETRY_AFTER_S)
+    app.state.admission = admission
+    app.state.cohort = CohortCache(ttl=RANKING_CACHE_TTL_S)
+    app.state.warm_cache = WarmCache(ttl=WARM_CACHE_TTL_S, max_entries=WARM_CACHE_MAX)
+
+    async def prefetch_detail(sid, version):
+        return await run_in_threadpool(lambda: fetch_student_detail(app.state.clients.db, sid))
+
+    async def prefetch_ai_summary(sid, version):
+        # shares the route's limit and in-flight computations (same key as
+        # get_ai_summary), never queues
+        return await admission["ai_summary"].run(
+            (sid, version), lambda: build_ai_summary(app.state.clients.db, sid), wait=False)
+
+    app.state.prefetcher = Prefetcher(
+        app.state.warm_cache,
+        loaders={"detail": prefetch_detail, "ai_summary": prefetch_ai_summary},
+        depth=PREFETCH_DEPTH,
+        concurrency=PREFETCH_CONCURRENCY,
+    )
+    app.state.events = EventBuffer(
+        app.state.clients,
+        max_size=EVENT_BUFFER_MAX,
+        flush_size=EVENT_FLUSH_SIZE,
+        flush_interval=EVENT_FLUSH_INTERVAL_S,
+        on_flush=app.state.warm_cache.invalidate,
+    )
+
+    # allow frontend localhost (Next dev) and others
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # narrow this in prod
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.add_middleware(
+        SlowRequestMiddleware,
+        threshold_ms=SLOW_REQUEST_MS,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        admin_token=PROFILE_ADMIN_TOKEN,
+        profile_dir=PROFILE_DIR,
+        max_profiles=PROFILE_MAX_FILES,
+        sample_exclude=["/api/events"],  # high volume; profile it with the X-Profile header instead
+    )
+
+    app.include_router(router)
+    app.state.startup = {
+        "import_ms": IMPORT_MS,
+        "create_app_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return app
+
+IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+
+app = create_app()
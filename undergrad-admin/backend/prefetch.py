@@ -0,0 +1,186 @@
+# backend/prefetch.py
+"""
+Background warming of the student detail view.
+
+When the student list is served, the ids on that page are queued for
+prefetch (first cards first, newest list request first). A small pool of
+workers fetches each student's detail payload and AI summary and keeps them
+in a TTL/LRU cache, so the follow-up click on a student is served from
+memory. The AI summary goes through the route's admission limit without
+waiting for a slot, so prefetching yields to interactive requests.
+
+Writes to a student invalidate its entries, but only in the process that
+handled the write: with several server workers another process can serve a
+stale entry for up to the TTL, which is why the cache is off by default
+when WEB_CONCURRENCY > 1 (see main.py).
+
+The metrics report how many warmed entries were actually used and at which
+list position, which is what PREFETCH_DEPTH should be tuned against.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+from fastapi import HTTPException
+
+logger = logging.getLogger("undergrad.prefetch")
+
+
+class WarmCache:
+    """Thread-safe TTL + LRU cache keyed by (kind, student id)."""
+
+    def __init__(self, ttl: float = 60, max_entries: int = 2000):
+        self.enabled = ttl > 0
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._kinds = set()  # first halves of the keys, so invalidate() needn't scan
+        self._lock = threading.Lock()
+        # bumped by invalidate() so a load that raced a write is not cached
+        self._versions: Dict[str, int] = {}
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.warmed = 0
+        self.warm_used = 0
+        self.used_by_position: Dict[int, int] = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            position = entry[2]
+            if position is not None:
+                # first use of a prefetched entry
+                self.warm_used += 1
+                self.used_by_position[position] = self.used_by_position.get(position, 0) + 1
+                entry[2] = None
+            return entry[1]
+
+    def fresh(self, key) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] >= time.monotonic()
+
+    def version(self, sid: str) -> int:
+        with self._lock:
+            return self._versions.get(sid, 0)
+
+    def put(self, key, value, version: int, position: Optional[int] = None):
+        """Cache value unless the student was invalidated since `version` was read."""
+        with self._lock:
+            if not self.enabled or self._versions.get(key[1], 0) != version:
+                return
+            if position is not None:
+                self.warmed += 1
+            self._kinds.add(key[0])
+            self._entries[key] = [time.monotonic() + self.ttl, value, position]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sid: str):
+        with self._lock:
+            self._versions[sid] = self._versions.get(sid, 0) + 1
+            for kind in self._kinds:
+                self._entries.pop((kind, sid), None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "warmed": self.warmed,
+                "warm_used": self.warm_used,
+                "warm_hit_rate": round(self.warm_used / self.warmed, 3) if self.warmed else None,
+                "used_by_position": dict(sorted(self.used_by_position.items())),
+            }
+
+
+class Prefetcher:
+    """Priority queue of students to warm, drained by `concurrency` workers."""
+
+    def __init__(self, cache: WarmCache, loaders: Dict[str, Callable], depth: int = 12,
+                 concurrency: int = 4, max_queue: int = 500):
+        self.cache = cache
+        self.loaders = loaders  # kind -> async fn(sid, version) returning the value to cache
+        self.depth = depth
+        self.concurrency = concurrency
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_queue)
+        self._queued = set()
+        self._generation = itertools.count()
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self.dropped = 0
+        self.failed = 0
+        self.shed = 0
+
+    def enqueue(self, sids: List[str]):
+        """Queue the first `depth` ids of a list page; later pages outrank older ones."""
+        if self.depth <= 0 or not self._workers:
+            return
+        generation = -next(self._generation)
+        for position, sid in enumerate(sids[:self.depth]):
+            if sid in self._queued:
+                continue
+            try:
+                self._queue.put_nowait((generation, position, next(self._seq), sid))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                continue
+            self._queued.add(sid)
+
+    async def start(self):
+        if self.depth > 0 and self.cache.enabled:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while True:
+            _, position, _, sid = await self._queue.get()
+            self._queued.discard(sid)
+            try:
+                for kind, load in self.loaders.items():
+                    key = (kind, sid)
+                    if not self.cache.fresh(key):
+                        version = self.cache.version(sid)
+                        self.cache.put(key, await load(sid, version), version, position)
+            except Exception as e:
+                if isinstance(e, HTTPException) and e.status_code in (429, 503):
+                    # the admission limit is busy with interactive requests
+                    self.shed += 1
+                    continue
+                # e.g. the student was deleted since the list was served
+                self.failed += 1
+                logger.warning("prefetch of student %s failed: %r", sid, e)
+            finally:
+                self._queue.task_done()
+
+    def snapshot(self) -> dict:
+        return {
+            "depth": self.depth,
+            "concurrency": self.concurrency,
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "shed": self.shed,
+            **self.cache.snapshot(),
+        }
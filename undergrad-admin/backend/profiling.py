@@ -0,0 +1,302 @@
+# backend/profiling.py
+"""
+Slow-request logging and on-demand sampling profiles.
+
+Every request runs with a lightweight trace that records how long it spent in
+Firestore calls. Requests slower than the configured threshold are logged with
+a per-call breakdown. A request can additionally be profiled with a stack
+sampler (admin header or random sampling), which writes a collapsed-stack
+file (`*.folded`) that flamegraph.pl / speedscope can render directly. Only
+the newest `max_profiles` files are kept in the profile directory.
+"""
+import functools
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+logger = logging.getLogger("undergrad.profiling")
+
+PROFILE_HEADER = b"x-profile"
+
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """Firestore call timings collected for a single request."""
+
+    __slots__ = ("calls", "depth", "threads")
+
+    def __init__(self):
+        # label -> [count, total seconds]
+        self.calls = {}
+        self.depth = 0
+        # worker threads currently running this request's code (see follow_thread)
+        self.threads = set()
+
+    def record(self, label: str, elapsed: float):
+        entry = self.calls.get(label)
+        if entry is None:
+            self.calls[label] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def breakdown(self):
+        rows = [
+            {"call": label, "count": count, "ms": round(total * 1000, 1)}
+            for label, (count, total) in self.calls.items()
+        ]
+        rows.sort(key=lambda r: r["ms"], reverse=True)
+        return rows
+
+
+# --- Firestore instrumentation ---
+
+def _label_for(obj, op: str) -> str:
+    # Query / CollectionReference -> collection id, DocumentReference -> parent collection id
+    parent = getattr(obj, "_parent", None)
+    if parent is not None and hasattr(parent, "id"):
+        return f"{op} {parent.id}"
+    path = getattr(obj, "_path", None)
+    if path and len(path) >= 2:
+        return f"{op} {path[-2]}"
+    return op
+
+
+def _wrap_call(fn, op: str):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None or trace.depth:
+            return fn(self, *args, **kwargs)
+        trace.depth += 1
+        start = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            trace.depth -= 1
+            trace.record(_label_for(self, op), time.perf_counter() - start)
+    return wrapper
+
+
+def _timed_iter(gen, trace: RequestTrace, label: str):
+    # Streams do their RPC work lazily, so time the iteration rather than the call.
+    elapsed = 0.0
+    try:
+        while True:
+            trace.depth += 1
+            start = time.perf_counter()
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+                trace.depth -= 1
+            yield item
+    finally:
+        trace.record(label, elapsed)
+
+
+def _wrap_stream(fn, op: str):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None or trace.depth:
+            return fn(self, *args, **kwargs)
+        return _timed_iter(iter(fn(self, *args, **kwargs)), trace, _label_for(self, op))
+    return wrapper
+
+
+_installed = False
+
+
+def install_firestore_hooks():
+    """Patch the Firestore client classes once so calls are timed per request.
+
+    Outside a traced request the wrappers fall straight through to the
+    original method, so the overhead is a single ContextVar lookup. Called
+    when the Firestore client is first created (see clients.py) so that
+    importing the app does not pull in the Firestore modules.
+    """
+    global _installed
+    if _installed:
+        return
+    from google.cloud.firestore_v1.batch import WriteBatch
+    from google.cloud.firestore_v1.document import DocumentReference
+    from google.cloud.firestore_v1.query import Query
+
+    Query.get = _wrap_call(Query.get, "get")
+    Query.stream = _wrap_stream(Query.stream, "stream")
+    for name in ("get", "set", "update", "delete", "create"):
+        setattr(DocumentReference, name, _wrap_call(getattr(DocumentReference, name), name))
+    WriteBatch.commit = _wrap_call(WriteBatch.commit, "batch.commit")
+    _installed = True
+
+
+# --- Sampling profiler ---
+
+def follow_thread(fn):
+    """Wrap fn so an active sampler also samples the worker thread it runs on.
+
+    Use for work handed to the threadpool (run_in_threadpool copies the
+    request context, so the current trace is visible inside the thread).
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        trace.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace.threads.discard(ident)
+    return wrapper
+
+
+class StackSampler:
+    """Samples a request's threads at a fixed interval into collapsed-stack counts.
+
+    The event loop thread is always sampled, plus any worker threads the
+    request registered via follow_thread. Async handlers share the event
+    loop thread, so a profile can include frames from other requests that
+    ran while this one was awaiting.
+    """
+
+    def __init__(self, thread_id: int, interval: float, trace: Optional[RequestTrace] = None):
+        self.thread_id = thread_id
+        self.trace = trace
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            idents = [self.thread_id]
+            if self.trace is not None:
+                idents.extend(tuple(self.trace.threads))
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.counts.items():
+                f.write(f"{stack} {count}\n")
+
+
+def _profile_filename(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{method}-{slug}.folded"
+
+
+# --- Middleware ---
+
+class SlowRequestMiddleware:
+    """ASGI middleware that logs slow requests and optionally profiles them.
+
+    threshold_ms <= 0 disables slow-request logging; sample_rate and
+    admin_token control which requests get a stack profile. Paths in
+    sample_exclude (high-volume routes) are never randomly sampled.
+    """
+
+    def __init__(
+        self,
+        app,
+        threshold_ms: float = 1000,
+        sample_rate: float = 0.0,
+        admin_token: Optional[str] = None,
+        profile_dir: str = "./profiles",
+        interval_ms: float = 5,
+        max_profiles: int = 200,
+        sample_exclude: Iterable[str] = (),
+    ):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token.encode() if admin_token else None
+        self.profile_dir = profile_dir
+        self.max_profiles = max_profiles
+        self.sample_exclude = frozenset(sample_exclude)
+        self.interval = interval_ms / 1000
+        self.enabled = self.threshold > 0 or self.sample_rate > 0 or self.admin_token is not None
+
+    def _wants_profile(self, scope) -> bool:
+        if self.admin_token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.admin_token)
+        if scope["path"] in self.sample_exclude:
+            return False
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = _current_trace.set(trace)
+        sampler = None
+        if self._wants_profile(scope):
+            sampler = StackSampler(threading.get_ident(), self.interval, trace)
+            sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_trace.reset(token)
+            method, path = scope["method"], scope["path"]
+            if sampler is not None:
+                sampler.stop()
+                self._write_profile(sampler, method, path)
+            if self.threshold > 0 and elapsed >= self.threshold:
+                breakdown = trace.breakdown()
+                firestore_ms = sum(r["ms"] for r in breakdown)
+                logger.warning(
+                    "slow request %s %s took %.1fms (firestore %.1fms): %s",
+                    method, path, elapsed * 1000, firestore_ms, breakdown,
+                )
+
+    def _write_profile(self, sampler: StackSampler, method: str, path: str):
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            out = os.path.join(self.profile_dir, _profile_filename(method, path))
+            sampler.write(out)
+            logger.warning("wrote profile for %s %s to %s", method, path, out)
+            self._prune_profiles()
+        except OSError as e:
+            logger.error("could not write profile for %s %s: %s", method, path, e)
+
+    def _prune_profiles(self):
+        # file names start with a timestamp, so name order is age order
+        names = sorted(n for n in os.listdir(self.profile_dir) if n.endswith(".folded"))
+        for name in names[:max(0, len(names) - self.max_profiles)]:
+            os.remove(os.path.join(self.profile_dir, name))
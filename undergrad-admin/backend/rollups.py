@@ -0,0 +1,120 @@
+# backend/rollups.py
+"""
+Compaction of old interactions into daily rollups.
+
+Raw interactions older than the retention window are folded into
+students/{sid}/interaction_rollups/{YYYY-MM-DD} documents:
+
+    {"day": "2026-01-31", "total": 7, "counts": {"login": 4, "ai_question": 3},
+     "first_ts": <ts>, "last_ts": <ts>}
+
+and the student doc keeps running totals in `rollup_totals`
+({"total": n, "counts": {...}, "through": <ts>}) so the AI summary reads a
+single map instead of every historic event. Each chunk's rollup updates and
+raw deletes (plus archive copies, if enabled) commit in the same batch, so
+an interrupted run never double counts.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from clients import firestore
+
+# events per batch: archive copy + delete per event plus <= one rollup per
+# event stays under Firestore's 500 writes per batch
+CHUNK_SIZE = 150
+MIN_RETENTION_DAYS = 7  # the summary's "recent activity" window must stay raw
+
+ARCHIVE_COLLECTION = "interaction_archive"
+
+
+def as_utc(ts) -> Optional[datetime]:
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(ts, datetime):
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def compact_student(db, sid: str, cutoff: datetime, archive: bool = False) -> int:
+    """Fold this student's interactions older than cutoff into daily rollups. Returns events compacted."""
+    student_ref = db.collection("students").document(sid)
+    rollups = student_ref.collection("interaction_rollups")
+    raw = student_ref.collection("interactions")
+    compacted = 0
+
+    while True:
+        chunk = list(raw.where(filter=firestore.FieldFilter("ts", "<", cutoff))
+                     .order_by("ts").limit(CHUNK_SIZE).stream())
+        if not chunk:
+            break
+
+        days = {}
+        totals = {}
+        for snap in chunk:
+            data = snap.to_dict()
+            ts = as_utc(data["ts"])  # the range filter only matches timestamps
+            typ = data.get("type", "unknown")
+            day = days.setdefault(ts.date().isoformat(), {"total": 0, "counts": {}, "first_ts": ts, "last_ts": ts})
+            day["total"] += 1
+            day["counts"][typ] = day["counts"].get(typ, 0) + 1
+            day["first_ts"] = min(day["first_ts"], ts)
+            day["last_ts"] = max(day["last_ts"], ts)
+            totals[typ] = totals.get(typ, 0) + 1
+
+        # first/last need the existing rollup values; one batched read per chunk
+        existing = {
+            s.id: s.to_dict()
+            for s in db.get_all([rollups.document(day) for day in days])
+            if s.exists
+        }
+
+        batch = db.batch()
+        for day, agg in days.items():
+            prev = existing.get(day) or {}
+            first_ts, last_ts = agg["first_ts"], agg["last_ts"]
+            if prev.get("first_ts") is not None:
+                first_ts = min(first_ts, as_utc(prev["first_ts"]))
+            if prev.get("last_ts") is not None:
+                last_ts = max(last_ts, as_utc(prev["last_ts"]))
+            batch.set(rollups.document(day), {
+                "day": day,
+                "total": firestore.Increment(agg["total"]),
+                "counts": {typ: firestore.Increment(n) for typ, n in agg["counts"].items()},
+                "first_ts": first_ts,
+                "last_ts": last_ts,
+            }, merge=True)
+
+        batch.set(student_ref, {
+            "rollup_totals": {
+                "total": firestore.Increment(sum(totals.values())),
+                "counts": {typ: firestore.Increment(n) for typ, n in totals.items()},
+                "through": cutoff,
+            },
+        }, merge=True)
+
+        for snap in chunk:
+            if archive:
+                batch.set(db.collection(ARCHIVE_COLLECTION).document(), {**snap.to_dict(), "student_id": sid})
+            batch.delete(snap.reference)
+        batch.commit()
+        compacted += len(chunk)
+
+        if len(chunk) < CHUNK_SIZE:
+            break
+    return compacted
+
+
+def compact_all(db, retention_days: int, archive: bool = False, log=print) -> int:
+    """Run compact_student for every student. Returns total events compacted."""
+    retention_days = max(retention_days, MIN_RETENTION_DAYS)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    total = 0
+    for student in db.collection("students").select([]).stream():
+        n = compact_student(db, student.id, cutoff, archive=archive)
+        if n:
+            log(f"  → {student.id}: compacted {n} interactions")
+        total += n
+    return total
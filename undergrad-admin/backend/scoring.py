@@ -0,0 +1,180 @@
+# backend/scoring.py
+"""
+Priority / engagement rules for students, scalar and vectorized.
+
+generate_ai_summary uses the scalar functions for one student; the ranking
+endpoint applies the same rules to the whole student base in one NumPy pass
+over columnar counters. The counters live on each student document:
+
+    counters.interactions    total interactions ever logged
+    counters.communications  total communications logged
+    counters.open_tasks      tasks currently in status "open"
+    last_active              timestamp of the latest interaction
+
+They are kept up to date by the write routes and the event buffer;
+backfill_counters.py computes them for existing data. NumPy is imported
+by the vectorized functions only, so importing the app doesn't pay for it.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+RECENT_WINDOW_S = 7 * 24 * 3600
+
+STATUSES = ["Exploring", "Shortlisting", "Applying", "Submitted"]
+_STATUS_CODE = {s: i for i, s in enumerate(STATUSES)}
+_UNKNOWN_STATUS = -1
+
+ENGAGEMENT_LEVELS = ["needs more engagement", "moderately engaged", "highly engaged"]
+
+
+# --- scalar rules (one student) ---
+
+def engagement_level(total_activity: int) -> str:
+    if total_activity > 10:
+        return "highly engaged"
+    elif total_activity > 5:
+        return "moderately engaged"
+    return "needs more engagement"
+
+
+def priority_score(status: str, recent_interactions: int, open_tasks: int, num_communications: int, total_activity: int) -> int:
+    """Priority score (1-5) used to decide who to contact next."""
+    if status in ["Applying", "Submitted"] and recent_interactions == 0:
+        return 5  # high
+    elif open_tasks > 2 or num_communications == 0:
+        return 4
+    elif status == "Exploring" and total_activity < 3:
+        return 2
+    return 3  # default
+
+
+# --- vectorized rules (whole cohort) ---
+
+_NAN = float("nan")
+
+
+def _to_epoch(val) -> float:
+    """Firestore timestamp / datetime / ISO string -> epoch seconds (nan if missing)."""
+    if val is None:
+        return _NAN
+    if isinstance(val, str):
+        try:
+            val = datetime.fromisoformat(val.replace("Z", "+00:00"))
+        except ValueError:
+            return _NAN
+    if isinstance(val, datetime):
+        if val.tzinfo is None:
+            val = val.replace(tzinfo=timezone.utc)
+        return val.timestamp()
+    return _NAN
+
+
+class CohortColumns:
+    """Per-student counters laid out as parallel NumPy arrays."""
+
+    FIELDS = ["name", "application_status", "counters", "last_active"]
+
+    def __init__(self, ids, names, status, interactions, communications, open_tasks, last_active):
+        self.ids = ids
+        self.names = names
+        self.status = status
+        self.interactions = interactions
+        self.communications = communications
+        self.open_tasks = open_tasks
+        self.last_active = last_active
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_docs(cls, docs) -> "CohortColumns":
+        import numpy as np
+
+        ids, names, status, inter, comms, tasks, last = [], [], [], [], [], [], []
+        for d in docs:
+            data = d.to_dict() or {}
+            counters = data.get("counters") or {}
+            ids.append(d.id)
+            names.append(data.get("name"))
+            status.append(_STATUS_CODE.get(data.get("application_status", "Exploring"), _UNKNOWN_STATUS))
+            inter.append(counters.get("interactions", 0))
+            comms.append(counters.get("communications", 0))
+            tasks.append(counters.get("open_tasks", 0))
+            last.append(_to_epoch(data.get("last_active")))
+        return cls(
+            ids=np.array(ids, dtype=object),
+            names=np.array(names, dtype=object),
+            status=np.array(status, dtype=np.int8),
+            interactions=np.array(inter, dtype=np.int64),
+            communications=np.array(comms, dtype=np.int64),
+            open_tasks=np.array(tasks, dtype=np.int64),
+            last_active=np.array(last, dtype=np.float64),
+        )
+
+
+def score_cohort(cols: CohortColumns, now: Optional[float] = None):
+    """Return (priority, engagement_code, recently_active) arrays for every student.
+
+    Mirrors priority_score / engagement_level; "recent interactions == 0"
+    is equivalent to last_active being missing or older than 7 days.
+    """
+    import numpy as np
+
+    now = time.time() if now is None else now
+    total_activity = cols.interactions + cols.communications
+    with np.errstate(invalid="ignore"):
+        recently_active = cols.last_active > now - RECENT_WINDOW_S  # nan -> False
+
+    late_stage = cols.status >= _STATUS_CODE["Applying"]
+    exploring = cols.status == _STATUS_CODE["Exploring"]
+    priority = np.select(
+        [
+            late_stage & ~recently_active,
+            (cols.open_tasks > 2) | (cols.communications == 0),
+            exploring & (total_activity < 3),
+        ],
+        [5, 4, 2],
+        default=3,
+    ).astype(np.int8)
+    engagement = (total_activity > 5).astype(np.int8) + (total_activity > 10)
+    return priority, engagement, recently_active
+
+
+def rank_cohort(cols: CohortColumns, limit: int, now: Optional[float] = None):
+    """Indices of the top `limit` students: highest priority first, then longest inactive."""
+    import numpy as np
+
+    now = time.time() if now is None else now
+    priority, engagement, _ = score_cohort(cols, now)
+    n = len(cols)
+    if n == 0:
+        return np.array([], dtype=np.int64), priority, engagement
+    # never-active students sort as the most stale within their priority
+    idle = np.where(np.isnan(cols.last_active), 1e12, np.clip(now - cols.last_active, 0, 1e12))
+    key = priority.astype(np.float64) * 1e13 + idle
+    limit = min(limit, n)
+    top = np.argpartition(-key, limit - 1)[:limit]
+    top = top[np.argsort(-key[top], kind="stable")]
+    return top, priority, engagement
+
+
+class CohortCache:
+    """Caches the cohort columns for `ttl` seconds so ranking doesn't rescan students each call."""
+
+    def __init__(self, ttl: float = 60):
+        self.ttl = ttl
+        self._cols: Optional[CohortColumns] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, db) -> CohortColumns:
+        with self._lock:
+            if self._cols is None or time.monotonic() - self._loaded_at > self.ttl:
+                docs = db.collection("students").select(CohortColumns.FIELDS).stream()
+                self._cols = CohortColumns.from_docs(docs)
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+            return self._cols
@@ -42,7 +42,12 @@ export default function HomePage() {
   const { data: students, isLoading, error } = useQuery<Student[], Error>({
     queryKey: ['students'],
     queryFn: async () => {
-      const res = await axios.get('http://127.0.0.1:8000/api/students');
+      // only the fields the dashboard cards and quick filters use
+      const res = await axios.get('http://127.0.0.1:8000/api/students', {
+        params: {
+          fields: 'name,email,country,grade,application_status,last_active,not_contacted_7days,high_intent,needs_essay_help',
+        },
+      });
       return res.data.students;
     },
   });